@@ -33,7 +33,8 @@ def find_and_remove_nosolutions(df):
     if len(error_rows) > 0:
         error_rows_desc = error_rows[['instance_id', 'degradation', 'bound']].to_records(index=False)
         raise Exception(f"Found -2 (ERROR) in following searches: {error_rows_desc}")
-    return df.drop(df[(df['h_cost'] == -1) | (df['p_cost'] == -1)].index)
+    # -1 is a timeout and -3 is a memory limit, in both cases the number of expanded nodes is partial
+    return df.drop(df[df['h_cost'].isin((-1, -3)) | df['p_cost'].isin((-1, -3))].index)
 
 
 def main():
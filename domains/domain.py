@@ -15,6 +15,22 @@ class Domain(ABC):
     def get_successors_and_op_cost(self, state):
         pass
 
+    def heuristic_config(self):
+        """Returns everything that determines the heuristic value of a state (used to validate search checkpoints)."""
+        return {}
+
+    def symmetries(self):
+        """Returns the symmetry group of the domain (without the identity), as functions mapping a state to a state
+        with the same cost to the goal and the same heuristic value."""
+        return []
+
+    def canonical_state(self, state, symmetries=None):
+        # The smallest state in the orbit of the given state represents the entire orbit. Searchers pass the symmetries
+        # they resolved once, so they are not recomputed for every generated state.
+        if symmetries is None:
+            symmetries = self.symmetries()
+        return min((state, *(symmetry(state) for symmetry in symmetries)))
+
 
 @dataclass(frozen=True, order=True)
 class DomainState:
@@ -40,6 +40,10 @@ class Pancakes(Domain):
             else:
                 raise Exception("If fraction is given, it has to be 0.5 for half gaps")
 
+    def heuristic_config(self):
+        return {'goal': self.goal_state.stack, 'ignore_pancakes_up_to': self.ignore_pancakes_up_to,
+                'half_gap': self.half_gap}
+
     def heuristic(self, state):
         # In this formula, we always add 1 if the max pancake is not at the bottom.
         gaps = 0
@@ -54,6 +58,19 @@ class Pancakes(Domain):
                     gaps += 1
         return gaps + (state.stack[0] != max(state.stack))
 
+    def symmetries(self):
+        # The gap heuristic is invariant under inverting the stack's permutation only when no pancake is ignored
+        if self.ignore_pancakes_up_to == 0 and self.goal_state.stack == tuple(range(self.size, 0, -1)):
+            return [self.invert]
+        return []
+
+    def invert(self, state):
+        # Relative to the goal, the stack is a permutation, and the same flips (in reverse order) sort its inverse
+        stack = [0] * self.size
+        for i, pancake in enumerate(state.stack):
+            stack[self.size - pancake] = self.size - i
+        return PancakesState(tuple(stack))
+
     def goal_test(self, state):
         return state.stack == self.goal_state.stack
 
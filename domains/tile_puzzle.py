@@ -43,6 +43,8 @@ class TilePuzzle(Domain):
         self.width = width
         self.height = height
         self.size = self.width * self.height
+        # The position each position is mapped to when reflecting the board along its main diagonal
+        self.transposed_position = [(pos % self.width) * self.width + pos // self.width for pos in range(self.size)]
         self.ignore_tiles_up_to = ignore_tiles_up_to
 
         if self.ignore_tiles_up_to < 0:
@@ -89,6 +91,9 @@ class TilePuzzle(Domain):
                     goal_pos // self.width - pos // self.width
                 )  # # difference in column + difference in row
 
+    def heuristic_config(self):
+        return {'goal': self.goal_state.puzzle, 'ignore_tiles_up_to': self.ignore_tiles_up_to}
+
     def heuristic(self, state) -> int:
         min_dist = 0
 
@@ -99,6 +104,20 @@ class TilePuzzle(Domain):
 
         return min_dist
 
+    def symmetries(self):
+        # With the identity goal, reflecting along the diagonal both moves the tiles and relabels them, so the goal is
+        # mapped to itself. Ignored tiles are not relabeled consistently, so then Manhattan distance is not invariant.
+        if self.width == self.height and self.goal_state.puzzle == tuple(range(self.size)) and \
+                self.ignore_tiles_up_to == 0:
+            return [self.reflect_diagonal]
+        return []
+
+    def reflect_diagonal(self, state: TilePuzzleState) -> TilePuzzleState:
+        puzzle = [0] * self.size
+        for pos, tile in enumerate(state.puzzle):
+            puzzle[self.transposed_position[pos]] = self.transposed_position[tile]
+        return TilePuzzleState(tuple(puzzle), self.transposed_position[state.blank])
+
     def goal_test(self, state):
         return self.goal_state == state
 
@@ -6,12 +6,30 @@ from tqdm import tqdm
 from domains.pancakes import PancakesState, Pancakes
 from search.astar_searcher import AstarSearcher
 from search.potential_searcher import PotentialSearcher
-from search.searcher import Timeout, NoSolution
+from search.searcher import Timeout, NoSolution, MemoryLimit, read_checkpoint
 
+MEMORY_COLUMNS = ('peak_open', 'closed', 'stale', 'bytes_per_node', 'peak_rss')
 
-def setup(instances_id_path, results_path):
+
+def results_header(memory_stats):
+    header = 'instance_id,degradation,bound,h_cost,h_expanded,p_cost,p_expanded'
+    if memory_stats:
+        header += ''.join(f',{prefix}_{column}' for prefix in ('h', 'p') for column in MEMORY_COLUMNS)
+    return header
+
+
+def check_results_header(results_path, memory_stats):
+    with open(results_path, 'r') as f:
+        if next(f).strip() != results_header(memory_stats):
+            raise Exception(f'Results file {results_path} has different columns than the ones written with '
+                            f'memory_stats={memory_stats}')
+
+
+def setup(instances_id_path, results_path, memory_stats=False):
     if results_path.is_file() != instances_id_path.is_file():
         raise Exception('Results file cannot exists without instances-ids file and vice versa')
+    if results_path.is_file():
+        check_results_header(results_path, memory_stats)
     curr_id = 0
     instances_set = set()
     if instances_id_path.is_file():
@@ -22,25 +40,73 @@ def setup(instances_id_path, results_path):
                 instance_id = int(instance_id)
                 instance_stack = tuple(int(i) for i in instance_str.split(';'))
                 instances_set.add(PancakesState(stack=instance_stack))
-                curr_id = instance_id
-        if curr_id != 0:
-            curr_id += 1
+                # Instances whose ground truth search was extended are written after later ones
+                curr_id = max(curr_id, instance_id + 1)
     else:
         with open(instances_id_path, 'w+') as f:
             f.write('instance_id,stack,cost\n')
         with open(results_path, 'w+') as f:
-            f.write('instance_id,degradation,bound,h_cost,h_expanded,p_cost,p_expanded\n')
+            f.write(results_header(memory_stats) + '\n')
     return curr_id, instances_set
 
 
 def run_experiment(curr_id, instances_set, instances_id_path, results_path, domain, instances_num=100, timeout=300,
-                   quiet=False):
-    for _ in tqdm(range(instances_num), total=instances_num, disable=quiet):
-        with open(instances_id_path, 'a') as instances_f:
-            new_instance = create_instance(domain, instances_set)
+                   quiet=False, memory_stats=False, memory_limit=None, ground_truth_timeout=3600, checkpoints_dir=None,
+                   checkpoint_interval=600, canonicalize=False):
+    check_results_header(results_path, memory_stats)
+    if checkpoints_dir is not None:
+        checkpoints_dir.mkdir(parents=True, exist_ok=True)
+    # Ground truth searches that timed out (or were killed) in a previous run are extended from their checkpoints
+    # (with the new ground truth timeout) before new instances are created
+    pending_ids = []
+    if checkpoints_dir is not None:
+        for path in sorted(checkpoints_dir.glob('ground_truth_*.ckpt')):
+            instance_id = int(path.stem[len('ground_truth_'):])
+            checkpoint = read_checkpoint(path)
+            curr_id = max(curr_id, instance_id + 1)
+            if checkpoint['init_state'] in instances_set:
+                path.unlink()  # Killed after the instance was written, but before the checkpoint was deleted
+            elif checkpoint['elapsed'] >= ground_truth_timeout:
+                tqdm.write(f'Skipping instance {instance_id}: its ground truth search already ran for '
+                           f'{checkpoint["elapsed"]} seconds, raise the ground truth timeout to extend it')
+            else:
+                pending_ids.append(instance_id)
+        pending_ids.sort()
+
+    # Only instances whose ground truth search finished count towards instances_num
+    written = 0
+    with tqdm(total=instances_num, disable=quiet) as pbar:
+        while written < instances_num:
+            checkpoint_path = None
+            if pending_ids:
+                instance_id = pending_ids.pop(0)
+                checkpoint_path = checkpoints_dir.joinpath(f'ground_truth_{instance_id}.ckpt')
+                new_instance = read_checkpoint(checkpoint_path)['init_state']
+            else:
+                instance_id = curr_id
+                curr_id += 1
+                if checkpoints_dir is not None:
+                    checkpoint_path = checkpoints_dir.joinpath(f'ground_truth_{instance_id}.ckpt')
+                new_instance = create_instance(domain, instances_set)
             domain.set_heuristic_degradation(0)
-            true_cost = AstarSearcher(domain).solve(new_instance, timeout=3600, quiet=True)[0]
-            instances_f.write(f'{curr_id},{";".join(str(i) for i in new_instance.stack)},{true_cost}\n')
+            try:
+                # Only the cost is needed, so symmetric states can optionally be merged
+                true_cost = AstarSearcher(domain).solve(new_instance, timeout=ground_truth_timeout, quiet=True,
+                                                        canonicalize=canonicalize, checkpoint_path=checkpoint_path,
+                                                        checkpoint_interval=checkpoint_interval, resume=True)[0]
+            except Timeout:
+                if checkpoint_path is None:
+                    raise
+                # The instance is skipped, and its checkpoint is kept so a later run can extend it
+                tqdm.write(f'Ground truth search of instance {instance_id} timed out, checkpoint saved to '
+                           f'{checkpoint_path}')
+                continue
+            with open(instances_id_path, 'a') as instances_f:
+                instances_f.write(f'{instance_id},{";".join(str(i) for i in new_instance.stack)},{true_cost}\n')
+            instances_set.add(new_instance)
+            # Only deleted once the instance is written, so a finished ground truth is never lost
+            if checkpoint_path is not None and checkpoint_path.is_file():
+                checkpoint_path.unlink()
             with open(results_path, 'a') as results_f:
                 for degradation in (0, 0.5, 1, 1.5, 2):
                     domain.set_heuristic_degradation(degradation)
@@ -50,22 +116,28 @@ def run_experiment(curr_id, instances_set, instances_id_path, results_path, doma
                                                (1.5, math.ceil(true_cost * 1.5)),
                                                (1.75, math.ceil(true_cost * 1.75)),
                                                (2, math.ceil(true_cost * 2))):
-                        h_cost, h_expanded = run_search(domain, new_instance, bound, True, timeout)
-                        p_cost, p_expanded = run_search(domain, new_instance, bound, False, timeout)
-                        results_f.write(
-                            f'{curr_id},{degradation},{bound_label},{h_cost},{h_expanded},{p_cost},{p_expanded}\n')
-        curr_id += 1
+                        h_cost, h_pts = run_search(domain, new_instance, bound, True, timeout, memory_limit)
+                        p_cost, p_pts = run_search(domain, new_instance, bound, False, timeout, memory_limit)
+                        line = (f'{instance_id},{degradation},{bound_label},'
+                                f'{h_cost},{h_pts.expanded},{p_cost},{p_pts.expanded}')
+                        if memory_stats:
+                            line += ''.join(f',{stat}' for stat in h_pts.memory_stats() + p_pts.memory_stats())
+                        results_f.write(line + '\n')
+            written += 1
+            pbar.update(1)
 
 
-def run_search(domain, instance, bound, pure_heuristic, timeout):
+def run_search(domain, instance, bound, pure_heuristic, timeout, memory_limit=None):
     pts = PotentialSearcher(domain)
     try:
-        cost_found, _ = pts.solve(instance, bound, pure_heuristic, timeout, True)
+        cost_found, _ = pts.solve(instance, bound, pure_heuristic, timeout, True, memory_limit)
     except Timeout:
         cost_found = -1
     except NoSolution:
         cost_found = -2
-    return cost_found, pts.expanded
+    except MemoryLimit:
+        cost_found = -3
+    return cost_found, pts
 
 
 def create_instance(domain, instances_set):
@@ -77,12 +149,17 @@ def create_instance(domain, instances_set):
 
 def main():
     num_of_pancakes = 14
+    # The timeout of an extended ground truth search includes the time spent in previous runs, so raise this to extend
+    # the ground truth searches that timed out
+    ground_truth_timeout = 3600
     files_dir = pathlib.Path.cwd().parent.joinpath('files')
     instances_id_path = files_dir.joinpath(f'pancakes_instances_ids_{num_of_pancakes}.csv')
     results_path = files_dir.joinpath(f'pancakes_results_{num_of_pancakes}.csv')
+    checkpoints_dir = files_dir.joinpath(f'pancakes_checkpoints_{num_of_pancakes}')
     curr_id, instances_set = setup(instances_id_path, results_path)
     domain = Pancakes(size=num_of_pancakes)
-    run_experiment(curr_id, instances_set, instances_id_path, results_path, domain, instances_num=100, timeout=300)
+    run_experiment(curr_id, instances_set, instances_id_path, results_path, domain, instances_num=100, timeout=300,
+                   ground_truth_timeout=ground_truth_timeout, checkpoints_dir=checkpoints_dir)
 
 
 if __name__ == '__main__':
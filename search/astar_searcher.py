@@ -1,4 +1,5 @@
 import heapq
+import os
 import time
 
 from tqdm import tqdm
@@ -7,21 +8,43 @@ from search.searcher import Searcher, SearchNode, Timeout, NoSolution
 
 
 class AstarSearcher(Searcher):
-    def solve(self, init_state, timeout=60, quiet=False):
+    def solve(self, init_state, timeout=60, quiet=False, memory_limit=None, canonicalize=False,
+              checkpoint_path=None, checkpoint_interval=None, resume=False):
         self.reset_stats()
-        start_time = time.time()
-        root_h = self.domain.heuristic(init_state)
-        root = SearchNode(root_h, root_h, 0, init_state)
-        self.generated += 1
-        # This might be somewhat counter-intuitive, but we update closed alongside open, since we cannot search in
-        # O(1) in a priority queue, that is why we have an in_open field in SearchNode
-        closed = {root.state: root}
-        open_ = [root]
+        key_of = self.state_key_function(canonicalize)
+
+        # The timeout of a resumed search includes the time spent before the checkpoint was written
+        params = {'canonicalize': canonicalize}
+        if resume and checkpoint_path is not None and os.path.isfile(checkpoint_path):
+            open_, closed, elapsed = self.load_checkpoint(checkpoint_path, init_state, params, key_of)
+        else:
+            root_h = self.domain.heuristic(init_state)
+            root = SearchNode(root_h, root_h, 0, init_state)
+            self.generated += 1
+            # This might be somewhat counter-intuitive, but we update closed alongside open, since we cannot search in
+            # O(1) in a priority queue, that is why we have an in_open field in SearchNode
+            closed = {key_of(root.state): root}
+            open_ = [root]
+            elapsed = 0
+        start_time = time.time() - elapsed
+        last_checkpoint_time = time.time()
         with tqdm(disable=quiet) as pbar:
             while open_:
-                # Check for timeouts
-                if time.time() - start_time > timeout:
-                    raise Timeout(f"Timed out after {time.time() - start_time} seconds.")
+                if len(open_) > self.peak_open_size:
+                    self.peak_open_size = len(open_)
+
+                # Check for timeouts, and keep the work done so far so it can be resumed with a larger timeout
+                now = time.time()
+                if now - start_time > timeout:
+                    self.update_memory_stats(open_, closed)
+                    if checkpoint_path is not None:
+                        self.save_checkpoint(checkpoint_path, init_state, open_, closed, now - start_time, params)
+                    raise Timeout(f"Timed out after {now - start_time} seconds.")
+
+                if checkpoint_path is not None and checkpoint_interval is not None and \
+                        now - last_checkpoint_time > checkpoint_interval:
+                    self.save_checkpoint(checkpoint_path, init_state, open_, closed, now - start_time, params)
+                    last_checkpoint_time = time.time()
 
                 node = heapq.heappop(open_)
                 node.in_open = False
@@ -30,23 +53,30 @@ class AstarSearcher(Searcher):
                 # expensive, instead of updating the node, we insert an updated node as a new node, and set the previous
                 # to be invalid. Then we encounter an invalid node, we simply discard it
                 if not node.is_valid:
+                    self.stale_in_open -= 1
                     continue
 
                 if self.domain.goal_test(node.state):
                     self.total_time = time.time() - start_time
+                    self.update_memory_stats(open_, closed)
                     self.cost = node.g
                     return self.cost, self.total_time
 
                 self.expanded += 1
                 pbar.update(1)
 
+                # Sample memory usage once in a while, and abort if the (soft) memory limit was exceeded
+                if self.expanded % self.memory_check_interval == 0:
+                    self.check_memory(open_, closed, memory_limit)
+
                 for (neighbor, cost_to) in self.domain.get_successors_and_op_cost(node.state):
                     g_neighbor = node.g + cost_to
+                    key = key_of(neighbor)
 
                     # If the node already exists (i.e. we saw it before, and  it is in open or closed (checked only in
                     # closed since closed holds all nodes) and its g is bigger than the one we've seen, we discard it
                     # because we have a cheaper way to get to that node
-                    if neighbor in closed and closed[neighbor].g <= g_neighbor:
+                    if key in closed and closed[key].g <= g_neighbor:
                         continue
 
                     h_neighbor = self.domain.heuristic(neighbor)
@@ -57,19 +87,22 @@ class AstarSearcher(Searcher):
                     self.generated += 1
 
                     # If we have already seen this node before
-                    if neighbor in closed:
+                    if key in closed:
                         # Is it in open, and we need to update it, or was it already expanded?
-                        if closed[neighbor].in_open:
+                        if closed[key].in_open:
                             # Invalidate the current node in open. Closed always points to the latest (and only valid)
                             # node of a specific state. Also, if the current node in open is better, we would have not
                             # reached here.
-                            closed[neighbor].is_valid = False
+                            closed[key].is_valid = False
+                            self.stale_entries += 1
+                            self.stale_in_open += 1
                         else:
                             self.reopened += 1
                     # We reach here whether the node was in closed or not, and so update the closed dict and push the
                     # node into open
-                    closed[neighbor] = new_node
+                    closed[key] = new_node
                     heapq.heappush(open_, new_node)
 
             self.total_time = time.time() - start_time
+            self.update_memory_stats(open_, closed)
             raise NoSolution(f"No solution within bound {c}. Elapsed time: {self.total_time} seconds.")
@@ -1,3 +1,11 @@
+import dataclasses
+import gzip
+import heapq
+import itertools
+import os
+import pickle
+import sys
+import tracemalloc
 from abc import ABC, abstractmethod
 from dataclasses import dataclass, field
 
@@ -18,6 +26,14 @@ class SearchNode:
     is_valid: bool = field(default=True, repr=False, hash=False, compare=False)
 
 
+# The stats that are restored when resuming a search (the memory stats are only sampled, so they are not restored).
+# Stale entries are not written to checkpoints, so after resuming, open is smaller than it would have been, and the
+# peak_open_size of a resumed search can be lower than that of the same search run without interruption.
+CHECKPOINT_STATS = ('expanded', 'generated', 'reopened', 'stale_entries', 'peak_open_size')
+# How many nodes are written to a checkpoint at once
+CHECKPOINT_CHUNK_SIZE = 10000
+
+
 class Searcher(ABC):
     expanded: int
     generated: int
@@ -25,14 +41,23 @@ class Searcher(ABC):
     cost: float
     cost_lower_bound: float
     total_time: float
+    # Memory stats. Stale entries are invalidated nodes that were left in open instead of being updated in place,
+    # stale_entries counts all of them, while stale_in_open counts only those that were not popped yet
+    peak_open_size: int
+    closed_size: int
+    stale_entries: int
+    stale_in_open: int
+    bytes_per_node: float
+    peak_rss: int
+    traced_memory_baseline: int
+    canonical_keys: bool  # Whether closed is keyed by canonical states, which may be separate from the nodes' states
+
+    # How many expansions between two (relatively expensive) memory samples
+    memory_check_interval = 10000
 
     def __init__(self, domain: Domain):
         self.domain = domain
-        self.expanded = 0
-        self.generated = 0
-        self.reopened = 0
-        self.cost = None
-        self.total_time = None
+        self.reset_stats()
 
     def reset_stats(self):
         self.expanded = 0
@@ -40,6 +65,128 @@ class Searcher(ABC):
         self.reopened = 0
         self.cost = None
         self.total_time = None
+        self.peak_open_size = 0
+        self.closed_size = 0
+        self.stale_entries = 0
+        self.stale_in_open = 0
+        self.bytes_per_node = None
+        self.peak_rss = None
+        self.canonical_keys = False
+        # Memory traced before the search started (by the domain, earlier searches, etc.) is not attributed to its nodes
+        self.traced_memory_baseline = tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else None
+
+    def update_memory_stats(self, open_, closed):
+        """Samples the memory used by the search, and returns the estimated number of bytes held by open and closed."""
+        self.closed_size = len(closed)
+        # Closed holds every valid node, and open additionally holds the stale ones that were not popped yet
+        num_nodes = len(closed) + self.stale_in_open
+        if tracemalloc.is_tracing() and self.traced_memory_baseline is not None:
+            traced_memory = tracemalloc.get_traced_memory()[0] - self.traced_memory_baseline
+            self.bytes_per_node = traced_memory / num_nodes
+            containers_size = 0  # Already included in the traced memory
+        else:
+            # The estimate errs on the high side (e.g. shared instance dict keys are counted for every node), so the
+            # soft memory limit fires early rather than late
+            node = open_[-1] if open_ else next(iter(closed.values()))
+            node_size = sys.getsizeof(node) + sys.getsizeof(vars(node))
+            # Small integers are shared by the interpreter, so only float f/h/g values take memory per node
+            node_size += sum(sys.getsizeof(value) for value in (node.f, node.h, node.g) if isinstance(value, float))
+            state_size = sys.getsizeof(node.state) + sys.getsizeof(vars(node.state))
+            for state_field in dataclasses.fields(node.state):
+                state_size += sys.getsizeof(getattr(node.state, state_field.name))
+            node_size += state_size
+            # A canonical key is a separate state whenever the node's state is not canonical. That is counted for every
+            # node, so the estimate still errs on the high side.
+            if self.canonical_keys:
+                node_size += state_size
+            self.bytes_per_node = node_size
+            # The slots of the nodes in open and closed
+            containers_size = sys.getsizeof(open_) + sys.getsizeof(closed)
+        # Unlike ru_maxrss (the high-water mark of the entire process), this is the largest RSS sampled during this
+        # search, so it is not affected by previous searches
+        rss = current_rss()
+        if rss is not None and (self.peak_rss is None or rss > self.peak_rss):
+            self.peak_rss = rss
+        return self.bytes_per_node * num_nodes + containers_size
+
+    def check_memory(self, open_, closed, memory_limit):
+        estimated_memory = self.update_memory_stats(open_, closed)
+        if memory_limit is not None and estimated_memory > memory_limit:
+            raise MemoryLimit(f"Exceeded memory limit of {memory_limit} bytes (estimated {estimated_memory} bytes).")
+
+    def state_key_function(self, canonicalize):
+        """Returns the function that maps a state to its key in closed."""
+        # When canonicalizing, closed is keyed by the canonical state of each node, so that only one state of every
+        # symmetric set is expanded. Nodes still hold the actual state, as successors are generated from it.
+        symmetries = self.domain.symmetries() if canonicalize else []
+        self.canonical_keys = bool(symmetries)
+
+        def key_of(state):
+            if symmetries:
+                return self.domain.canonical_state(state, symmetries)
+            return state
+        return key_of
+
+    def memory_stats(self):
+        return self.peak_open_size, self.closed_size, self.stale_entries, self.bytes_per_node, self.peak_rss
+
+    def save_checkpoint(self, path, init_state, open_, closed, elapsed, params):
+        """Writes the search to disk, so it can be resumed by load_checkpoint."""
+        # Closed holds exactly one valid node per state, and the nodes in open are those with in_open set, so only
+        # closed is written (which also drops the stale entries of open). States are stored as tuples of their fields.
+        state_type = type(init_state)
+        field_names = [state_field.name for state_field in dataclasses.fields(state_type)]
+        header = {
+            'searcher': type(self).__name__,
+            'params': params,
+            'domain': type(self.domain).__name__,
+            'heuristic_config': self.domain.heuristic_config(),
+            'init_state': init_state,
+            'state_type': state_type,
+            'elapsed': elapsed,
+            'stats': {name: getattr(self, name) for name in CHECKPOINT_STATS},
+            'num_nodes': len(closed),
+        }
+        # Write to a temporary file first, so a search that is killed mid-write does not corrupt the last checkpoint
+        tmp_path = f'{path}.tmp'
+        with gzip.open(tmp_path, 'wb') as f:
+            pickler = pickle.Pickler(f, protocol=pickle.HIGHEST_PROTOCOL)
+            pickler.dump(header)
+            # The nodes are streamed in chunks, since a checkpoint is usually written when the search is at its largest
+            nodes = iter(closed.values())
+            while True:
+                chunk = [(tuple(getattr(node.state, name) for name in field_names), node.f, node.h, node.g,
+                          node.in_open) for node in itertools.islice(nodes, CHECKPOINT_CHUNK_SIZE)]
+                if not chunk:
+                    break
+                pickler.dump(chunk)
+                pickler.clear_memo()  # Otherwise the pickler keeps a reference to every chunk
+        os.replace(tmp_path, path)
+
+    def load_checkpoint(self, path, init_state, params, key_of):
+        """Restores the stats of a search written by save_checkpoint, and returns its open, closed and elapsed time."""
+        with gzip.open(path, 'rb') as f:
+            unpickler = pickle.Unpickler(f)
+            header = unpickler.load()
+            # The stored f and h values (and the pruned nodes) depend on the parameters and the heuristic
+            if header['searcher'] != type(self).__name__ or header['params'] != params or \
+                    header['domain'] != type(self.domain).__name__ or \
+                    header['heuristic_config'] != self.domain.heuristic_config() or header['init_state'] != init_state:
+                raise Exception(f'Checkpoint {path} was created by a different search')
+            for name, value in header['stats'].items():
+                setattr(self, name, value)
+
+            state_type = header['state_type']
+            closed = {}
+            open_ = []
+            while len(closed) < header['num_nodes']:
+                for state_fields, f, h, g, in_open in unpickler.load():
+                    node = SearchNode(f, h, g, state_type(*state_fields), in_open=in_open)
+                    closed[key_of(node.state)] = node
+                    if in_open:
+                        open_.append(node)
+        heapq.heapify(open_)
+        return open_, closed, header['elapsed']
 
     def __call__(self, *args, **kwargs):
         return self.solve(*args, **kwargs)
@@ -49,9 +196,28 @@ class Searcher(ABC):
         pass
 
 
+def current_rss():
+    """Returns the current resident set size of the process in bytes, or None if it is unavailable (not Linux)."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return None
+
+
+def read_checkpoint(path):
+    """Returns the header of a checkpoint (everything but its nodes)."""
+    with gzip.open(path, 'rb') as f:
+        return pickle.load(f)
+
+
 class Timeout(Exception):
     pass
 
 
 class NoSolution(Exception):
     pass
+
+
+class MemoryLimit(Exception):
+    pass